@@ -0,0 +1,6 @@
+# Settings shared by the modules that talk to the Base network. Kept free of
+# side effects so importing them doesn't need any environment variables
+
+# Receipt polling: Base produces a block every ~2s, so poll well inside that
+RECEIPT_TIMEOUT = 120
+RECEIPT_POLL_LATENCY = 0.25
@@ -1,13 +1,44 @@
-import json
+import asyncio
+from collections import OrderedDict
 from datetime import datetime
+import logging
 import os
+import struct
+import time
+import aiofiles
+import orjson
+
+logger = logging.getLogger(__name__)
+
+# Queued entries are written out at least this often (seconds)...
+FLUSH_INTERVAL = 0.25
+# ...or as soon as this many entries are waiting
+FLUSH_THRESHOLD = 256
+# Buffer size for log/index append handles; a whole batch usually fits
+WRITE_BUFFER_SIZE = 1 << 16
+# Block size used when reading a history file backwards
+READ_CHUNK_SIZE = 65536
+# Append handles kept open across flushes, least recently used closed first
+MAX_OPEN_HANDLES = 128
 
 class ConversationLogger:
-    def __init__(self, log_dir="conversation_logs"):
+    def __init__(self, log_dir="conversation_logs", flush_interval=FLUSH_INTERVAL,
+                 flush_threshold=FLUSH_THRESHOLD):
         """Initialize the conversation logger with a directory for storing logs"""
         self.log_dir = log_dir
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
         self._ensure_log_directory()
 
+        # Entries are queued as (user_id, json_line_bytes) and written in batches by
+        # a background task, started lazily since there is no running event
+        # loop yet when the bot constructs the logger
+        self._queue = asyncio.Queue()
+        self._flush_requested = asyncio.Event()
+        self._flush_task = None
+        self._closed = False
+        self._handles = OrderedDict()  # user_id -> (log file, index file), both append-mode
+
     def _ensure_log_directory(self):
         """Create the log directory if it doesn't exist"""
         if not os.path.exists(self.log_dir):
@@ -17,10 +48,110 @@ class ConversationLogger:
         """Get the log file path for a specific user"""
         return os.path.join(self.log_dir, f"conversation_{user_id}.jsonl")
 
+    def _get_index_file(self, user_id):
+        """Get the offset index path for a specific user's log
+
+        The index holds one little-endian uint64 per entry: the byte offset
+        just past that entry's line in the JSONL file.
+        """
+        return os.path.join(self.log_dir, f"conversation_{user_id}.idx")
+
+    async def _get_handles(self, user_id):
+        """Get cached append handles for a user's log and index, opening them if needed"""
+        handles = self._handles.get(user_id)
+        if handles is not None:
+            self._handles.move_to_end(user_id)
+            return handles
+
+        log_f = await aiofiles.open(self._get_conversation_file(user_id), 'ab', buffering=WRITE_BUFFER_SIZE)
+        try:
+            idx_f = await aiofiles.open(self._get_index_file(user_id), 'ab', buffering=WRITE_BUFFER_SIZE)
+        except Exception:
+            await log_f.close()
+            raise
+        handles = self._handles[user_id] = (log_f, idx_f)
+        if len(self._handles) > MAX_OPEN_HANDLES:
+            _, evicted = self._handles.popitem(last=False)
+            await self._close_handles(evicted)
+        return handles
+
+    @staticmethod
+    async def _close_handles(handles):
+        """Close a (log, index) handle pair, ignoring errors"""
+        for f in handles:
+            try:
+                await f.close()
+            except Exception:
+                pass
+
+    async def _enqueue(self, user_id, log_entry):
+        """Queue a log entry for the background flush task"""
+        if self._flush_task is None and not self._closed:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+        # Serialize with the trailing newline so a batch is one plain join
+        await self._queue.put((user_id, orjson.dumps(log_entry, option=orjson.OPT_APPEND_NEWLINE)))
+        if self._queue.qsize() >= self.flush_threshold:
+            self._flush_requested.set()
+
+    async def _flush_loop(self):
+        """Periodically write queued entries until the logger is closed"""
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            await self._flush()
+
+    async def _flush(self):
+        """Drain the queue and append each user's entries with a single write"""
+        batches = {}
+        while True:
+            try:
+                user_id, line = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+            batches.setdefault(user_id, []).append(line)
+
+        for user_id, lines in batches.items():
+            try:
+                log_f, idx_f = await self._get_handles(user_id)
+                offset = await log_f.tell()
+                offsets = []
+                for line in lines:
+                    offset += len(line)
+                    offsets.append(offset)
+
+                await log_f.write(b''.join(lines))
+                # Entries must be on disk before the index points at them
+                await log_f.flush()
+                await idx_f.write(struct.pack(f'<{len(offsets)}Q', *offsets))
+                await idx_f.flush()
+            except Exception as e:
+                logger.error(f"Failed to write conversation log for {user_id}: {e}")
+                # Drop the handles so the next flush reopens the files
+                broken = self._handles.pop(user_id, None)
+                if broken is not None:
+                    await self._close_handles(broken)
+
+    async def aclose(self):
+        """Stop the background flush task and write any pending entries"""
+        self._closed = True
+        self._flush_requested.set()
+        if self._flush_task is not None:
+            await self._flush_task
+            self._flush_task = None
+        await self._flush()
+
+        while self._handles:
+            _, handles = self._handles.popitem()
+            await self._close_handles(handles)
+
     async def log_message(self, user_id, user_name, message_type, content):
         """Log a single message in the conversation"""
         log_entry = {
-            "timestamp": datetime.now().isoformat(),
+            "ts_ns": time.time_ns(),
             "user_id": user_id,
             "user_name": user_name,
             "type": message_type,  # 'user' or 'assistant'
@@ -28,15 +159,14 @@ class ConversationLogger:
         }
         
         try:
-            with open(self._get_conversation_file(user_id), 'a', encoding='utf-8') as f:
-                f.write(json.dumps(log_entry) + '\n')
+            await self._enqueue(user_id, log_entry)
         except Exception as e:
             logger.error(f"Failed to log conversation: {e}")
 
     async def log_function_call(self, user_id, user_name, function_name, arguments, response):
         """Log a function call in the conversation"""
         log_entry = {
-            "timestamp": datetime.now().isoformat(),
+            "ts_ns": time.time_ns(),
             "user_id": user_id,
             "user_name": user_name,
             "type": "function_call",
@@ -46,24 +176,86 @@ class ConversationLogger:
         }
         
         try:
-            with open(self._get_conversation_file(user_id), 'a', encoding='utf-8') as f:
-                f.write(json.dumps(log_entry) + '\n')
+            await self._enqueue(user_id, log_entry)
         except Exception as e:
             logger.error(f"Failed to log function call: {e}")
 
+    @staticmethod
+    def _format_entry(entry):
+        """Add an ISO 'timestamp' to entries that were logged with 'ts_ns'"""
+        if "ts_ns" in entry and "timestamp" not in entry:
+            entry["timestamp"] = datetime.fromtimestamp(entry["ts_ns"] / 1e9).isoformat()
+        return entry
+
+    @staticmethod
+    def _read_last_lines(file_path, count):
+        """Read the last `count` lines of a file by scanning backwards in blocks"""
+        with open(file_path, 'rb') as f:
+            position = f.seek(0, os.SEEK_END)
+            data = b''
+            newlines = 0
+            # Stop once we've seen one newline more than needed, so the last
+            # `count` lines are known to be complete
+            while position > 0 and newlines <= count:
+                read_size = min(READ_CHUNK_SIZE, position)
+                position -= read_size
+                f.seek(position)
+                chunk = f.read(read_size)
+                newlines += chunk.count(b'\n')
+                data = chunk + data
+
+        return [line for line in data.splitlines() if line][-count:]
+
+    def _read_indexed_lines(self, user_id, count):
+        """Read the last `count` lines using the offset index
+
+        Returns None when the index can't answer (missing, or covering no
+        more than `count` entries, e.g. for logs that predate the index).
+        """
+        index_path = self._get_index_file(user_id)
+        if not os.path.exists(index_path):
+            return None
+
+        with open(index_path, 'rb') as idx:
+            entries = os.fstat(idx.fileno()).st_size // 8
+            if entries <= count:
+                return None
+            # End offsets of the entry before the wanted range and of the last entry
+            idx.seek((entries - count - 1) * 8)
+            start, = struct.unpack('<Q', idx.read(8))
+            idx.seek((entries - 1) * 8)
+            end, = struct.unpack('<Q', idx.read(8))
+
+        with open(self._get_conversation_file(user_id), 'rb') as f:
+            f.seek(start)
+            data = f.read(end - start)
+        if len(data) != end - start or not data.endswith(b'\n'):
+            return None  # Index and log disagree; let the caller scan instead
+
+        # A failed index write leaves gaps, so the range may hold extra entries
+        return data.splitlines()[-count:]
+
     def get_conversation_history(self, user_id, limit=None):
         """Retrieve conversation history for a specific user"""
         try:
             messages = []
             file_path = self._get_conversation_file(user_id)
             
-            if os.path.exists(file_path):
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    for line in f:
-                        messages.append(json.loads(line.strip()))
-                        
+            if not os.path.exists(file_path):
+                return messages
+                
             if limit:
-                messages = messages[-limit:]
+                # Only the tail is needed; seek via the index when possible,
+                # otherwise read backwards, rather than parsing the whole history
+                lines = self._read_indexed_lines(user_id, limit)
+                if lines is None:
+                    lines = self._read_last_lines(file_path, limit)
+                for line in lines:
+                    messages.append(self._format_entry(orjson.loads(line)))
+            else:
+                with open(file_path, 'rb') as f:
+                    for line in f:
+                        messages.append(self._format_entry(orjson.loads(line)))
                 
             return messages
         except Exception as e:
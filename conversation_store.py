@@ -0,0 +1,124 @@
+import logging
+from typing import NamedTuple, Optional, Sequence
+from cachetools import TTLCache
+import orjson
+
+try:
+    import redis.asyncio as redis
+    from redis.exceptions import WatchError
+except ImportError:  # Only needed when REDIS_URL is set
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# Private chats idle for longer than this (seconds) start over
+STATE_TTL = 3600
+# Users whose state is kept when running without Redis
+MAX_LOCAL_USERS = 10_000
+
+class ChatState(NamedTuple):
+    """A user's private chat state"""
+    response_id: Optional[str] = None  # Last response, chained from by the next turn
+    tool_outputs: Sequence[dict] = ()  # Function call outputs to send with the next turn
+    turns: int = 0  # Turns in the current response chain
+    summary: Optional[str] = None  # Summary of an earlier chain, sent with the next turn
+
+class ConversationStore:
+    """Per-user private chat state (see ChatState)
+
+    State lives in Redis when a `redis_url` is given, so it survives restarts
+    of the bot; otherwise it is kept in memory.
+    Either way it expires after `ttl` seconds without a turn.
+    """
+
+    def __init__(self, redis_url: Optional[str] = None, ttl: int = STATE_TTL):
+        """Initialize the store, connecting to Redis when `redis_url` is given"""
+        self.ttl = ttl
+        self._redis = None
+        self._local = TTLCache(maxsize=MAX_LOCAL_USERS, ttl=ttl)
+
+        if redis_url:
+            if redis is None:
+                logger.warning("redis is not installed; keeping chat state in memory")
+            else:
+                self._redis = redis.from_url(redis_url)
+
+    @staticmethod
+    def _key(user_id: int) -> str:
+        """Get the Redis key for a user's state"""
+        return f"conv:{user_id}"
+
+    @staticmethod
+    def _decode(raw) -> ChatState:
+        """Decode a state stored in Redis"""
+        return ChatState() if raw is None else ChatState(**orjson.loads(raw))
+
+    @staticmethod
+    def _encode(state: ChatState) -> bytes:
+        """Encode a state for Redis"""
+        return orjson.dumps(state._asdict())
+
+    async def get(self, user_id: int) -> ChatState:
+        """Get a user's state, empty if they have none"""
+        if self._redis is None:
+            return self._local.get(user_id, ChatState())
+
+        try:
+            return self._decode(await self._redis.get(self._key(user_id)))
+        except Exception as e:
+            logger.error(f"Failed to load chat state for {user_id}: {e}")
+            return ChatState()
+
+    async def set(self, user_id: int, state: ChatState):
+        """Save a user's state after a completed turn"""
+        if self._redis is None:
+            self._local[user_id] = state
+            return
+
+        try:
+            await self._redis.set(self._key(user_id), self._encode(state), ex=self.ttl)
+        except Exception as e:
+            logger.error(f"Failed to save chat state for {user_id}: {e}")
+
+    async def replace(self, user_id: int, response_id: Optional[str], state: ChatState) -> bool:
+        """Save a user's state only if their last response is still `response_id`
+
+        Returns False, leaving the state alone, if another turn got there first.
+        """
+        if self._redis is None:
+            if self._local.get(user_id, ChatState()).response_id != response_id:
+                return False
+            self._local[user_id] = state
+            return True
+
+        key = self._key(user_id)
+        try:
+            async with self._redis.pipeline(transaction=True) as pipe:
+                await pipe.watch(key)
+                if self._decode(await pipe.get(key)).response_id != response_id:
+                    return False
+                pipe.multi()
+                pipe.set(key, self._encode(state), ex=self.ttl)
+                await pipe.execute()
+            return True
+        except WatchError:
+            return False
+        except Exception as e:
+            logger.error(f"Failed to replace chat state for {user_id}: {e}")
+            return False
+
+    async def clear(self, user_id: int):
+        """Forget a user's state so their next message starts a new chain"""
+        if self._redis is None:
+            self._local.pop(user_id, None)
+            return
+
+        try:
+            await self._redis.delete(self._key(user_id))
+        except Exception as e:
+            logger.error(f"Failed to clear chat state for {user_id}: {e}")
+
+    async def aclose(self):
+        """Close the Redis connection, if any"""
+        if self._redis is not None:
+            await self._redis.aclose()
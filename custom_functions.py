@@ -1,13 +1,17 @@
+import asyncio
 from dataclasses import dataclass
 from typing import List, Optional
-from web3 import Web3
+from cachetools import TTLCache
+from web3 import AsyncWeb3, AsyncHTTPProvider, Web3
+from web3.exceptions import TransactionNotFound
 import os
 from dotenv import load_dotenv
+from base_network import RECEIPT_POLL_LATENCY, RECEIPT_TIMEOUT
 
 # Load environment variables from .env file
 load_dotenv()
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class FunctionResponse:
     """Standard response format for custom functions"""
     success: bool
@@ -47,6 +51,102 @@ USDC_ABI = [
     }
 ]
 
+# Checksum addresses (a Keccak-256 each) are computed once at import
+_USDC_ADDR = Web3.to_checksum_address(USDC_CONTRACT_ADDRESS)
+_BOT_ADDR = Web3.to_checksum_address(BOT_ADDRESS)
+
+# Shared async Web3 client and contract, built once so every call reuses the
+# same HTTP session and the parsed ABI. RPCs are awaited, so the event loop
+# keeps serving other users while a request is in flight
+_W3 = AsyncWeb3(AsyncHTTPProvider(BASE_RPC_URL))
+_USDC = _W3.eth.contract(address=_USDC_ADDR, abi=USDC_ABI)
+
+# Short-lived cache of USDC balances (in wei) by checksum address, so bursts of
+# balance checks and transfers don't repeat the same balanceOf RPC
+_BAL_CACHE = TTLCache(maxsize=1024, ttl=5)
+
+async def _cached_balance(address: str) -> int:
+    """Get the USDC balance (in wei) of an address, served from cache when fresh"""
+    if address in _BAL_CACHE:
+        return _BAL_CACHE[address]
+    balance = await _USDC.functions.balanceOf(address).call()
+    _BAL_CACHE[address] = balance
+    return balance
+
+# USDC (in wei) sent by transfers that haven't been mined yet. The node keeps
+# reporting the old balance until they are, so they're held against it
+_pending_spend = 0
+
+# Gas price barely moves between back-to-back transfers
+_GAS_PRICE_CACHE = TTLCache(maxsize=1, ttl=2)
+
+# Next nonce to use for the bot's account, tracked locally so bursts of
+# transfers don't each need a get_transaction_count RPC. None means it has
+# to be (re)synced from the node's pending count
+_next_nonce: Optional[int] = None
+# Held from reading the nonce until the transaction is sent, so nonces are
+# broadcast in order and a failed send can hand its nonce back
+_SEND_LOCK = asyncio.Lock()
+
+async def _cached_gas_price() -> int:
+    """Get the current gas price, served from cache when fresh"""
+    if "gas_price" in _GAS_PRICE_CACHE:
+        return _GAS_PRICE_CACHE["gas_price"]
+    gas_price = await _W3.eth.gas_price
+    _GAS_PRICE_CACHE["gas_price"] = gas_price
+    return gas_price
+
+async def _nonce_and_gas_price() -> tuple:
+    """Get the next nonce for the bot's account and the gas price; call with _SEND_LOCK held
+    
+    Returns:
+        tuple: (nonce, gas_price)
+    """
+    global _next_nonce
+    if _next_nonce is None:
+        # Fetch both concurrently instead of two back-to-back round trips
+        _next_nonce, gas_price = await asyncio.gather(
+            _W3.eth.get_transaction_count(_BOT_ADDR, 'pending'),
+            _cached_gas_price()
+        )
+    else:
+        gas_price = await _cached_gas_price()
+    return _next_nonce, gas_price
+
+def _resync_nonce():
+    """Forget the local nonce so the next transfer re-reads it from the node"""
+    global _next_nonce
+    _next_nonce = None
+
+# Status ('pending', 'confirmed', 'failed' or 'unconfirmed') of transfers sent
+# by this process, keyed by lowercase tx hash without the 0x prefix
+_TX_STATUS = TTLCache(maxsize=1024, ttl=24 * 3600)
+# Strong references to running confirmation tasks so they aren't garbage collected
+_CONFIRM_TASKS = set()
+
+def _tx_key(tx_hash: str) -> str:
+    """Normalize a tx hash for use as a _TX_STATUS key"""
+    return tx_hash.lower().removeprefix("0x")
+
+async def _confirm(tx_hash, amount_wei: int) -> None:
+    """Wait for a submitted transfer's receipt and record its outcome"""
+    global _pending_spend
+    key = _tx_key(tx_hash.hex())
+    try:
+        receipt = await _W3.eth.wait_for_transaction_receipt(
+            tx_hash, timeout=RECEIPT_TIMEOUT, poll_latency=RECEIPT_POLL_LATENCY
+        )
+        _TX_STATUS[key] = 'confirmed' if receipt['status'] == 1 else 'failed'
+    except Exception:
+        # Timed out or lost track of it; it may have been dropped, so re-sync the nonce
+        _TX_STATUS[key] = 'unconfirmed'
+        _resync_nonce()
+    finally:
+        # Whatever happened is now reflected on-chain (or never will be), so
+        # release the hold and re-read the balance next time
+        _pending_spend -= amount_wei
+        _BAL_CACHE.pop(_BOT_ADDR, None)
+
 async def get_base_usdc_balance() -> FunctionResponse:
     """Get the current USDC balance of this bot's Base account
     
@@ -54,19 +154,8 @@ async def get_base_usdc_balance() -> FunctionResponse:
         FunctionResponse: Contains success status and USDC balance information
     """
     try:
-        # Initialize Web3 with Base
-        w3 = Web3(Web3.HTTPProvider(BASE_RPC_URL))
-        
-        # Create contract instance
-        contract = w3.eth.contract(
-            address=w3.to_checksum_address(USDC_CONTRACT_ADDRESS),
-            abi=USDC_ABI
-        )
-        
         # Get balance
-        balance_wei = contract.functions.balanceOf(
-            w3.to_checksum_address(BOT_ADDRESS)
-        ).call()
+        balance_wei = await _cached_balance(_BOT_ADDR)
         
         # Convert to USDC (6 decimals for USDC)
         balance_usdc = balance_wei / 1e6
@@ -96,78 +185,78 @@ async def send_usdc(to_address: str, amount: float) -> FunctionResponse:
     Returns:
         FunctionResponse: Contains success status and transaction information
     """
+    global _next_nonce, _pending_spend
     try:
-        # Initialize Web3 with Base
-        w3 = Web3(Web3.HTTPProvider(BASE_RPC_URL))
-        
-        # Validate address
+        # Validate address, then checksum it once for reuse below
         if not Web3.is_address(to_address):
             return FunctionResponse(
                 success=False,
                 message="Invalid Ethereum address provided"
             )
+        recipient = Web3.to_checksum_address(to_address)
             
-        # Create contract instance
-        contract = w3.eth.contract(
-            address=w3.to_checksum_address(USDC_CONTRACT_ADDRESS),
-            abi=USDC_ABI
-        )
-        
         # Convert amount to wei (USDC has 6 decimals)
         amount_wei = int(amount * 1e6)
         
-        # Check balance
-        current_balance = contract.functions.balanceOf(
-            w3.to_checksum_address(BOT_ADDRESS)
-        ).call()
-        
-        if current_balance < amount_wei:
-            return FunctionResponse(
-                success=False,
-                message=f"Insufficient balance. Have {current_balance/1e6:.2f} USDC, need {amount} USDC"
+        async with _SEND_LOCK:
+            # Check balance, less transfers still in flight. The lock is held
+            # until this one is sent and counted, so concurrent transfers can't
+            # all pass the check against the same balance
+            current_balance = await _cached_balance(_BOT_ADDR) - _pending_spend
+            
+            if current_balance < amount_wei:
+                return FunctionResponse(
+                    success=False,
+                    message=f"Insufficient balance. Have {current_balance/1e6:.2f} USDC, need {amount} USDC"
+                )
+                
+            # Prepare transaction
+            nonce, gas_price = await _nonce_and_gas_price()
+            
+            transfer_txn = await _USDC.functions.transfer(
+                recipient,
+                amount_wei
+            ).build_transaction({
+                'from': _BOT_ADDR,
+                'nonce': nonce,
+                'gas': 100000,  # Estimated gas limit
+                'gasPrice': gas_price
+            })
+            
+            # Sign transaction
+            signed_txn = _W3.eth.account.sign_transaction(
+                transfer_txn,
+                private_key=BOT_PRIVATE_KEY
             )
             
-        # Prepare transaction
-        nonce = w3.eth.get_transaction_count(BOT_ADDRESS)
+            # Send transaction. The nonce only advances once it's been sent, so
+            # a failure before this leaves it for the next transfer
+            try:
+                tx_hash = await _W3.eth.send_raw_transaction(signed_txn.raw_transaction)
+            except Exception:
+                # The node may still have accepted it; re-read the nonce next time
+                _resync_nonce()
+                raise
+            _next_nonce = nonce + 1
+            _pending_spend += amount_wei
         
-        transfer_txn = contract.functions.transfer(
-            w3.to_checksum_address(to_address),
-            amount_wei
-        ).build_transaction({
-            'from': BOT_ADDRESS,
-            'nonce': nonce,
-            'gas': 100000,  # Estimated gas limit
-            'gasPrice': w3.eth.gas_price
-        })
+        # Confirm in the background instead of blocking for a block time;
+        # get_tx_status reports the outcome
+        _TX_STATUS[_tx_key(tx_hash.hex())] = 'pending'
+        task = asyncio.create_task(_confirm(tx_hash, amount_wei))
+        _CONFIRM_TASKS.add(task)
+        task.add_done_callback(_CONFIRM_TASKS.discard)
         
-        # Sign transaction
-        signed_txn = w3.eth.account.sign_transaction(
-            transfer_txn,
-            private_key=BOT_PRIVATE_KEY
+        return FunctionResponse(
+            success=True,
+            message=f"Submitted {amount} USDC to {to_address}",
+            data={
+                'tx_hash': tx_hash.hex(),
+                'amount': amount,
+                'recipient': to_address,
+                'status': 'pending'
+            }
         )
-        
-        # Send transaction
-        tx_hash = w3.eth.send_raw_transaction(signed_txn.raw_transaction)
-        
-        # Wait for transaction receipt
-        receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
-        
-        if receipt['status'] == 1:
-            return FunctionResponse(
-                success=True,
-                message=f"Successfully sent {amount} USDC to {to_address}",
-                data={
-                    'tx_hash': tx_hash.hex(),
-                    'amount': amount,
-                    'recipient': to_address
-                }
-            )
-        else:
-            return FunctionResponse(
-                success=False,
-                message="Transaction failed",
-                data={'tx_hash': tx_hash.hex()}
-            )
             
     except Exception as e:
         return FunctionResponse(
@@ -175,6 +264,36 @@ async def send_usdc(to_address: str, amount: float) -> FunctionResponse:
             message=f"Failed to send USDC: {str(e)}"
         )
 
+async def get_tx_status(tx_hash: str) -> FunctionResponse:
+    """Check whether a USDC transfer sent by this bot has been confirmed
+    
+    Args:
+        tx_hash (str): The transaction hash returned by send_usdc
+        
+    Returns:
+        FunctionResponse: Contains success status and the transaction's status
+    """
+    try:
+        status = _TX_STATUS.get(_tx_key(tx_hash))
+        if status is None:
+            # Not sent by this process (or long forgotten); ask the node
+            try:
+                receipt = await _W3.eth.get_transaction_receipt("0x" + _tx_key(tx_hash))
+                status = 'confirmed' if receipt['status'] == 1 else 'failed'
+            except TransactionNotFound:
+                status = 'unknown'
+                
+        return FunctionResponse(
+            success=True,
+            message=f"Transaction {tx_hash} is {status}",
+            data={'tx_hash': tx_hash, 'status': status}
+        )
+    except Exception as e:
+        return FunctionResponse(
+            success=False,
+            message=f"Failed to get transaction status: {str(e)}"
+        )
+
 async def get_weather(city: str, country: Optional[str] = None) -> FunctionResponse:
     """Get the current weather for a specified city
     
@@ -249,5 +368,18 @@ AVAILABLE_FUNCTIONS = {
             },
             "required": ["to_address", "amount"]
         }
+    },
+    "get_tx_status": {
+        "function": get_tx_status,
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "tx_hash": {
+                    "type": "string",
+                    "description": "Transaction hash returned by send_usdc"
+                }
+            },
+            "required": ["tx_hash"]
+        }
     }
 }
\ No newline at end of file
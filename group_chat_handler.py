@@ -1,15 +1,85 @@
-from datetime import datetime
+from cachetools import LRUCache, TTLCache
+from collections import deque
+from functools import lru_cache
+import asyncio
 import logging
+import re
+import sys
+import time
+from typing import Optional
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:  # Embeddings are optional; relevance falls back to keyword overlap
+    SentenceTransformer = None
 
 logger = logging.getLogger(__name__)
 
+# Small local sentence-embedding model used for relevance scoring
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+# Relevance thresholds. Keyword overlap ratios and embedding cosine
+# similarities are on different scales, so each scoring method has its own;
+# non-questions need 1.2x the relevance threshold
+KEYWORD_RELEVANCE_THRESHOLD = 0.7
+KEYWORD_CONTINUITY_THRESHOLD = 0.6
+EMBEDDING_RELEVANCE_THRESHOLD = 0.4
+EMBEDDING_CONTINUITY_THRESHOLD = 0.5
+
+# Seconds (time.monotonic) a group conversation stays active / messages stay in context
+CONVERSATION_WINDOW = 300
+
+# Upper bound on groups tracked at once, so per-group state can't grow forever
+MAX_TRACKED_GROUPS = 10_000
+
+# Common words ignored when comparing messages to context
+_STOPWORDS = frozenset({
+    "the", "a", "an", "and", "or", "but", "in", "on", "at", "to", "for",
+    "is", "are", "was", "were"
+})
+
+# Interned tokens: repeated words map to the same string object, whose hash is
+# already cached, which makes building and intersecting token sets cheaper
+_tok = lru_cache(maxsize=8192)(sys.intern)
+
+def _tokenize(text: str) -> frozenset:
+    """Split text into a set of lowercase, interned words"""
+    return frozenset(_tok(word) for word in text.lower().split())
+
 class GroupChatHandler:
-    def __init__(self, bot_context_file: str, relevance_threshold: float = 0.7):
+    # Question marks or common question phrasings, matched in a single pass
+    _QUESTION_RE = re.compile(
+        r"\?|\b(?:what|how|why|when|where|who|which|"
+        r"can you|could you|would you|is there|are there|tell me)\b",
+        re.IGNORECASE
+    )
+
+    def __init__(self, bot_context_file: str, relevance_threshold: float = KEYWORD_RELEVANCE_THRESHOLD,
+                 embedding_model: Optional[str] = EMBEDDING_MODEL,
+                 embedding_relevance_threshold: float = EMBEDDING_RELEVANCE_THRESHOLD,
+                 continuity_threshold: float = KEYWORD_CONTINUITY_THRESHOLD,
+                 embedding_continuity_threshold: float = EMBEDDING_CONTINUITY_THRESHOLD):
         self.context = self._load_context(bot_context_file)
+        # The context never changes after loading, so extract keywords once
+        self._context_keywords = self._extract_keywords_from_context()
+        self._context_keyword_count = max(1, len(self._context_keywords))
+        # The embedding model is loaded on first use rather than at startup,
+        # since loading it can mean a download
+        self._embedding_model = embedding_model
+        self._embedder_lock = asyncio.Lock()
+        self._embedder_loaded = False
+        self._embedder = None
+        self._context_vector = None
         self.relevance_threshold = relevance_threshold
-        self.active_conversations = {}  # Track active conversations by group
-        self.recent_messages = {}  # Store recent messages for context
-        self.last_response_time = {}  # Track when bot last responded in each group
+        self.embedding_relevance_threshold = embedding_relevance_threshold
+        self.continuity_threshold = continuity_threshold
+        self.embedding_continuity_threshold = embedding_continuity_threshold
+        # Per-group state is bounded; least recently active groups are evicted first
+        self.active_conversations = LRUCache(maxsize=MAX_TRACKED_GROUPS)  # Track active conversations by group
+        self.recent_messages = LRUCache(maxsize=MAX_TRACKED_GROUPS)  # Store recent messages for context
+        # Track when bot last responded in each group; entries far older than
+        # CONVERSATION_WINDOW no longer matter, so let them expire
+        self.last_response_time = TTLCache(maxsize=MAX_TRACKED_GROUPS, ttl=3600)
     
     def _load_context(self, context_file: str) -> str:
         """Load and parse the context file"""
@@ -20,117 +90,152 @@ class GroupChatHandler:
             logger.error(f"Error loading context file: {e}")
             return ""
         
+    async def _ensure_embedder(self):
+        """Load the embedding model on first use, off the event loop"""
+        if self._embedder_loaded:
+            return
+        async with self._embedder_lock:
+            if not self._embedder_loaded:
+                await asyncio.to_thread(self._load_embedder, self._embedding_model)
+                self._embedder_loaded = True
+        
+    def _load_embedder(self, model_name: Optional[str]):
+        """Load the embedding model and embed the context once, if available"""
+        if SentenceTransformer is None or not model_name or not self.context:
+            return
+            
+        try:
+            self._embedder = SentenceTransformer(model_name)
+            # Cache recent message embeddings; repeated texts skip the model
+            self._embed = lru_cache(maxsize=1024)(self._encode)
+            self._context_vector = self._embed(self.context)
+        except Exception as e:
+            logger.error(f"Error loading embedding model, using keyword relevance: {e}")
+            self._embedder = None
+            
+    def _encode(self, text: str):
+        """Embed text as a unit-length vector"""
+        return self._embedder.encode(text, normalize_embeddings=True)
+        
     async def should_respond(self, message: str, group_id: int, is_reply_to_bot: bool = False) -> bool:
         """Determine if the bot should respond to a message"""
         # Always respond if it's a direct reply to the bot
         if is_reply_to_bot:
             return True
             
+        await self._ensure_embedder()
+        threshold = (
+            self.embedding_relevance_threshold if self._embedder is not None
+            else self.relevance_threshold
+        )
+            
         # Check if message contains a question
         if self._is_question(message):
             relevance = await self._calculate_relevance(message)
-            return relevance >= self.relevance_threshold
+            return relevance >= threshold
             
         # Check if message is part of an active conversation
-        if self._is_part_of_active_conversation(group_id, message):
+        if await self._is_part_of_active_conversation(group_id, message):
             return True
             
         # Check if message is highly relevant to bot's purpose
         relevance = await self._calculate_relevance(message)
-        return relevance >= self.relevance_threshold * 1.2  # Higher threshold for non-questions
+        return relevance >= threshold * 1.2  # Higher threshold for non-questions
         
     def _is_question(self, message: str) -> bool:
         """Detect if a message contains a question"""
-        question_indicators = [
-            "?",
-            "what", "how", "why", "when", "where", "who", "which",
-            "can you", "could you", "would you",
-            "is there", "are there",
-            "tell me"
-        ]
-        
-        message_lower = message.lower()
-        return any(indicator in message_lower for indicator in question_indicators)
+        return bool(self._QUESTION_RE.search(message))
         
     async def _calculate_relevance(self, message: str) -> float:
         """Calculate relevance score of message to bot's context"""
-        # This would use embeddings comparison or keyword matching
-        # For now, using a simple keyword-based approach
-        relevant_keywords = self._extract_keywords_from_context()
-        message_keywords = set(message.lower().split())
+        if self._embedder is not None:
+            # Cosine similarity of normalized embeddings; encode off the event loop
+            vector = await asyncio.to_thread(self._embed, message)
+            return float(vector @ self._context_vector)
+            
+        # Fall back to keyword overlap when no embedding model is available
+        message_keywords = _tokenize(message) - _STOPWORDS
         
-        keyword_matches = len(set(relevant_keywords) & message_keywords)
-        return min(1.0, keyword_matches / max(1, len(relevant_keywords)))
+        keyword_matches = len(self._context_keywords & message_keywords)
+        return min(1.0, keyword_matches / self._context_keyword_count)
     
-    def _extract_keywords_from_context(self) -> set:
+    def _extract_keywords_from_context(self) -> frozenset:
         """Extract relevant keywords from the bot's context"""
         # This is a simple implementation - you might want to make this more sophisticated
         # by using NLP techniques or maintaining a curated list of keywords
-        words = self.context.lower().split()
+        words = _tokenize(self.context)
         # Remove common words and keep only meaningful keywords
-        stopwords = {"the", "a", "an", "and", "or", "but", "in", "on", "at", "to", "for", "is", "are", "was", "were"}
-        return {word for word in words if word not in stopwords and len(word) > 2}
+        return frozenset(word for word in words if word not in _STOPWORDS and len(word) > 2)
         
     def update_conversation_context(self, group_id: int, message: str, 
                                   message_id: int, user_id: int):
         """Update the conversation context for a group"""
         if group_id not in self.recent_messages:
-            self.recent_messages[group_id] = []
+            # maxlen keeps only the last 10 messages without re-slicing
+            self.recent_messages[group_id] = deque(maxlen=10)
             
         self.recent_messages[group_id].append({
             'message_id': message_id,
             'user_id': user_id,
             'content': message,
-            'timestamp': datetime.now()
+            'timestamp': time.monotonic()
         })
         
-        # Keep only last 10 messages or messages from last 5 minutes
+        # Drop messages older than 5 minutes
         self._prune_old_messages(group_id)
         
-    def _is_part_of_active_conversation(self, group_id: int, message: str) -> bool:
+    async def _is_part_of_active_conversation(self, group_id: int, message: str) -> bool:
         """Check if message is part of an ongoing conversation"""
         if group_id not in self.recent_messages:
             return False
             
         # Check if there's been recent bot activity
-        last_response = self.last_response_time.get(group_id, 0)
-        if isinstance(last_response, (int, float)) and last_response == 0:
+        last_response = self.last_response_time.get(group_id)
+        if last_response is None:
             return False
             
-        time_diff = (datetime.now() - last_response).seconds if isinstance(last_response, datetime) else float('inf')
-        if time_diff > 300:  # 5 minute timeout
+        if time.monotonic() - last_response > CONVERSATION_WINDOW:
             return False
             
         # Check contextual relevance to recent messages
-        recent_context = ' '.join([m['content'] for m in self.recent_messages[group_id][-3:]])
-        relevance = self._calculate_context_similarity(recent_context, message)
+        recent_context = ' '.join([m['content'] for m in list(self.recent_messages[group_id])[-3:]])
+        relevance = await self._calculate_context_similarity(recent_context, message)
         
-        return relevance > 0.6  # Threshold for conversation continuity
+        # Threshold for conversation continuity
+        if self._embedder is not None:
+            return relevance > self.embedding_continuity_threshold
+        return relevance > self.continuity_threshold
     
-    def _calculate_context_similarity(self, context: str, message: str) -> float:
+    async def _calculate_context_similarity(self, context: str, message: str) -> float:
         """Calculate similarity between context and message"""
-        # Simple word overlap similarity for now
-        context_words = set(context.lower().split())
-        message_words = set(message.lower().split())
+        if self._embedder is not None:
+            # Encode off the event loop, as in _calculate_relevance
+            return await asyncio.to_thread(
+                lambda: float(self._embed(context) @ self._embed(message))
+            )
+            
+        # Simple word overlap similarity without embeddings
+        context_words = _tokenize(context) - _STOPWORDS
+        message_words = _tokenize(message) - _STOPWORDS
         
         overlap = len(context_words & message_words)
         return overlap / max(1, len(context_words | message_words))
         
     def _prune_old_messages(self, group_id: int):
         """Remove old messages from context"""
-        current_time = datetime.now()
-        self.recent_messages[group_id] = [
-            msg for msg in self.recent_messages[group_id]
-            if (current_time - msg['timestamp']).seconds < 300  # 5 minute window
-        ][-10:]  # Keep only last 10 messages
+        current_time = time.monotonic()
+        messages = self.recent_messages[group_id]
+        # Messages are in arrival order, so only the oldest need checking
+        while messages and current_time - messages[0]['timestamp'] > CONVERSATION_WINDOW:
+            messages.popleft()
         
     def get_conversation_context(self, group_id: int) -> list:
         """Get recent conversation context for a group"""
         if group_id not in self.recent_messages:
             return []
             
-        return self.recent_messages[group_id]
+        return list(self.recent_messages[group_id])
         
     def update_last_response_time(self, group_id: int):
         """Update the timestamp of the bot's last response in a group"""
-        self.last_response_time[group_id] = datetime.now()
\ No newline at end of file
+        self.last_response_time[group_id] = time.monotonic()
\ No newline at end of file
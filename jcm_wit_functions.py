@@ -1,26 +1,38 @@
+import atexit
 import logging
+import logging.handlers
+import queue
 from telegram import Update, InlineQueryResultArticle, InputTextMessageContent
 from telegram.ext import (
+    AIORateLimiter,
     Application, 
     CommandHandler, 
     MessageHandler, 
     filters, 
     ContextTypes,
     ConversationHandler,
-    InlineQueryHandler
+    InlineQueryHandler,
+    PersistenceInput,
+    PicklePersistence
 )
+from dataclasses import asdict
 from datetime import datetime
-import json
 import asyncio
 from openai import AsyncOpenAI
+import orjson
 from typing import Optional, Dict, Any
 import signal
 import sys
+import time
+from types import SimpleNamespace
 from dotenv import load_dotenv
 import os
+import re
 from uuid import uuid4
 from conversation_logger import ConversationLogger
+from conversation_store import ChatState, ConversationStore
 from group_chat_handler import GroupChatHandler
+from response_cache import ResponseCache
 
 # Load environment variables from .env file
 load_dotenv()
@@ -28,7 +40,35 @@ load_dotenv()
 # Get environment variables
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# Optional: keep private chat state in Redis so it survives restarts
+REDIS_URL = os.getenv("REDIS_URL")
+# Which users are in a /chat session, kept across restarts
+PERSISTENCE_FILE = "jcn_bot_state.pickle"
 CONTEXT_FILE = "user_context.txt"
+OPENAI_MODEL = "gpt-4o-mini"
+# Seconds to wait for more messages from the same user before answering in a
+# group, by total buffered length: (max chars, delay), longest delay otherwise
+GROUP_BATCH_DELAYS = ((320, 0.18), (1024, 0.3))
+GROUP_BATCH_MAX_DELAY = 0.6
+# Streamed replies are edited in place at most this often (seconds), and only
+# once at least this many new characters have arrived
+STREAM_EDIT_INTERVAL = 0.8
+STREAM_EDIT_MIN_CHARS = 24
+# Group replies count against Telegram's 20 msg/min per-group limit, so they
+# are edited far less often and at most this many times before the final text
+GROUP_STREAM_EDIT_INTERVAL = 3.0
+GROUP_STREAM_MAX_EDITS = 3
+GROUP_CHAT_PROMPT = "You are in a group chat. Keep responses concise and natural."
+# Private chats are summarized and restarted once a response chain reaches this
+# many turns, so the context sent with each turn doesn't grow without bound
+CHAT_SUMMARY_TURNS = 20
+CHAT_SUMMARY_MAX_TOKENS = 200
+CHAT_SUMMARY_PROMPT = (
+    "Summarize our conversation so far in a few sentences for your own future "
+    "reference. Keep names, amounts, addresses and anything still unresolved."
+)
+# Set to 1 to also serve cached responses for semantically similar messages
+SEMANTIC_RESPONSE_CACHE = os.getenv("SEMANTIC_RESPONSE_CACHE") == "1"
 
 if not TELEGRAM_TOKEN or not OPENAI_API_KEY:
     raise ValueError("TELEGRAM_TOKEN and OPENAI_API_KEY must be set in .env file")
@@ -36,19 +76,71 @@ if not TELEGRAM_TOKEN or not OPENAI_API_KEY:
 # Import custom functions
 from custom_functions import AVAILABLE_FUNCTIONS
 
-# Set up logging
-logging.basicConfig(
-    filename=f'jcn_bot_{datetime.now().strftime("%Y%m%d")}.log',
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
+# Function definitions for the API, built once since AVAILABLE_FUNCTIONS is fixed after import
+FUNCTION_DEFINITIONS = tuple(
+    {
+        "name": name,
+        "description": func["function"].__doc__,
+        "parameters": func["parameters"]
+    }
+    for name, func in AVAILABLE_FUNCTIONS.items()
+)
+# The same functions in the Responses API tool format. Strict mode is off since
+# the parameter schemas have optional properties
+RESPONSE_TOOLS = tuple(
+    {"type": "function", "strict": False, **definition}
+    for definition in FUNCTION_DEFINITIONS
+)
+
+# Set up logging. Handlers on the event loop thread only enqueue records; a
+# listener thread does the (blocking) file writes
+log_queue = queue.Queue(-1)
+log_file_handler = logging.FileHandler(
+    f'jcn_bot_{datetime.now().strftime("%Y%m%d")}.log',
+    delay=True
 )
+log_file_handler.setFormatter(
+    logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+)
+log_listener = logging.handlers.QueueListener(log_queue, log_file_handler)
+log_queue_handler = logging.handlers.QueueHandler(log_queue)
+# The queue handler merges args into the message before enqueueing; the file
+# handler applies the real format, so don't let basicConfig add its own here
+log_queue_handler.setFormatter(logging.Formatter('%(message)s'))
+logging.basicConfig(handlers=[log_queue_handler], level=logging.INFO)
+log_listener.start()
+# Flush queued records on exit
+atexit.register(log_listener.stop)
 logger = logging.getLogger(__name__)
 
 class JCNBot:
     def __init__(self, telegram_token: str, openai_api_key: Optional[str] = None, context_file: str = "user_context.txt"):
         """Initialize the bot with tokens"""
         self.telegram_token = telegram_token
-        self.application = Application.builder().token(telegram_token).build()
+        self.application = (
+            Application.builder()
+            .token(telegram_token)
+            # Queue outgoing calls within Telegram's flood limits (30 msg/s
+            # overall, 20 msg/min per group) instead of hitting 429s and retrying
+            .rate_limiter(AIORateLimiter(
+                overall_max_rate=30,
+                overall_time_period=1,
+                group_max_rate=20,
+                group_time_period=60,
+                max_retries=3
+            ))
+            # Only the conversation states are persisted, so users stay in
+            # their /chat session (and its stored chain) across restarts
+            .persistence(PicklePersistence(
+                PERSISTENCE_FILE,
+                store_data=PersistenceInput(
+                    bot_data=False, chat_data=False, user_data=False, callback_data=False
+                )
+            ))
+            .post_init(self.post_init)
+            .post_shutdown(self.post_shutdown)
+            .build()
+        )
         
         # Initialize conversation logger
         self.conversation_logger = ConversationLogger()
@@ -68,14 +160,38 @@ class JCNBot:
             logger.warning("No OpenAI API key provided")
             self.openai_client = None
         
-        # Store active conversations
-        self.active_conversations = {}
+        # Cache of responses to stateless (group and inline) prompts
+        self.response_cache = ResponseCache(
+            embed=self.embed_text if SEMANTIC_RESPONSE_CACHE and self.openai_client else None
+        )
+        
+        # Group messages buffered per (group_id, user_id) and the tasks that
+        # will answer them once the user pauses
+        self._pending_group_messages: Dict[tuple, list] = {}
+        self._pending_group_tasks: Dict[tuple, asyncio.Task] = {}
+        
+        # Private chat state: OpenAI keeps the history server-side, so per user we
+        # only track the last response to chain from and any function call
+        # outputs that still have to be sent back with the next turn
+        self.conversation_store = ConversationStore(REDIS_URL)
+        # Users whose chain is being summarized in the background
+        self._summarizing_users = set()
         
         # Context file paths
         self.context_file = context_file
         self.system_prompt_file = "system_prompt.txt"
         self.jason_context_file = "jason_context.txt"
         
+        # Compiled (private, group) contexts, reused until one of the context files changes
+        self._context_cache = None
+        self._context_mtimes = None
+        # Chat Completions system messages built from the compiled contexts
+        self._system_messages = None
+        
+        # Matches mentions of the bot in group messages; built at startup, once
+        # the bot's username is known
+        self._mention_re = None
+        
         # Setup handlers
         self.setup_handlers()
 
@@ -94,7 +210,9 @@ class JCNBot:
                     CommandHandler("end", self.end_chat)
                 ]
             },
-            fallbacks=[CommandHandler("end", self.end_chat)]
+            fallbacks=[CommandHandler("end", self.end_chat)],
+            name="private_chat",
+            persistent=True
         )
         self.application.add_handler(private_conv_handler)
         
@@ -136,11 +254,9 @@ class JCNBot:
         )
             
         # Check if bot is mentioned
-        bot_username = context.bot.username.lower() if context.bot.username else ""
-        is_mentioned = any(name.lower() in message.lower() for name in [
-            f"@{bot_username}",
-            "@jdawg_bot"
-        ])
+        if self._mention_re is None:
+            self._mention_re = self._compile_mention_re(context.bot.username)
+        is_mentioned = bool(self._mention_re.search(message))
             
         # Only respond if:
         # 1. It's a command, or
@@ -150,17 +266,8 @@ class JCNBot:
             
         if should_respond:
             try:
-                # Send typing indicator
-                await context.bot.send_chat_action(
-                    chat_id=group_id,
-                    action="typing"
-                )
-                    
                 # Clean the message (remove bot mentions)
-                clean_message = message.lower()
-                if context.bot.username:
-                    clean_message = clean_message.replace(f"@{context.bot.username.lower()}", "")
-                clean_message = clean_message.replace("@jdawg_bot", "").strip()
+                clean_message = self._mention_re.sub("", message).strip()
                     
                 # Handle /chat command
                 if '/chat' in message:
@@ -170,21 +277,8 @@ class JCNBot:
                     )
                     return
                     
-                # Generate response
-                response = await self.openai_client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=[
-                        {"role": "system", "content": self.read_context_file()},
-                        {"role": "system", "content": "You are in a group chat. Keep responses concise and natural."},
-                        {"role": "user", "content": clean_message}
-                    ],
-                    functions=self.get_function_definitions(),
-                    function_call="auto",
-                    max_tokens=1024
-                )
-                    
-                # Process the response
-                await self.process_ai_response(update, context, response, None)
+                # Answer a quick burst of messages from the same user in one go
+                self.queue_group_message(update, context, clean_message)
                     
             except Exception as e:
                 logger.error(f"Error in group chat response: {str(e)}", exc_info=True)
@@ -193,6 +287,75 @@ class JCNBot:
                     reply_to_message_id=message_id
                 )
 
+    def queue_group_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE, clean_message: str):
+        """Buffer a group message and (re)start the wait before answering it"""
+        key = (update.effective_chat.id, update.effective_user.id)
+        pending = self._pending_group_messages.setdefault(key, [])
+        pending.append(clean_message)
+        
+        # Tasks in this dict are still waiting, so cancelling just extends the window
+        task = self._pending_group_tasks.get(key)
+        if task is not None:
+            task.cancel()
+            
+        total_length = sum(len(m) for m in pending)
+        delay = next(
+            (d for max_length, d in GROUP_BATCH_DELAYS if total_length <= max_length),
+            GROUP_BATCH_MAX_DELAY
+        )
+        self._pending_group_tasks[key] = context.application.create_task(
+            self.flush_group_messages(key, update, context, delay),
+            update=update
+        )
+
+    async def flush_group_messages(self, key: tuple, update: Update,
+                                   context: ContextTypes.DEFAULT_TYPE, delay: float):
+        """Answer a user's buffered group messages once they stop sending more"""
+        await asyncio.sleep(delay)
+        
+        # From here on this batch is ours; new messages start a new one
+        del self._pending_group_tasks[key]
+        clean_message = "\n".join(self._pending_group_messages.pop(key))
+        await self.respond_in_group(update, context, clean_message)
+
+    async def respond_in_group(self, update: Update, context: ContextTypes.DEFAULT_TYPE, clean_message: str):
+        """Generate and send an AI response in a group chat, replying to `update`"""
+        try:
+            # Send typing indicator
+            await context.bot.send_chat_action(
+                chat_id=update.effective_chat.id,
+                action="typing"
+            )
+                
+            # Serve repeated questions from the response cache
+            system_message = self.system_message(is_group_chat=True)
+            system_prompt = system_message["content"]
+            cached = await self.response_cache.get(OPENAI_MODEL, system_prompt, clean_message)
+            if cached is not None:
+                await self.reply_cached_response(update, cached)
+                return
+                
+            # Generate response, showing text as it streams in
+            stream = await self.openai_client.chat.completions.create(
+                model=OPENAI_MODEL,
+                messages=[system_message, {"role": "user", "content": clean_message}],
+                functions=self.get_function_definitions(),
+                function_call="auto",
+                max_tokens=1024,
+                stream=True
+            )
+            function_calls, content = await self.stream_chat_completion(update, stream)
+                
+            # Process the response
+            await self.process_ai_response(update, context, function_calls, content, content_sent=True)
+            await self.cache_response(system_prompt, clean_message, function_calls, content)
+                
+        except Exception as e:
+            logger.error(f"Error in group chat response: {str(e)}", exc_info=True)
+            await update.message.reply_text(
+                "Sorry, I encountered an error while processing your message.",
+                reply_to_message_id=update.message.message_id
+            )
 
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle the /start command"""
@@ -218,8 +381,7 @@ class JCNBot:
 
     async def start_chat(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Start an AI chat session"""
-        user_id = update.effective_user.id
-        self.active_conversations[user_id] = []
+        await self.conversation_store.clear(update.effective_user.id)
         await update.message.reply_text(
             "Starting AI chat session. You can talk directly with me now!\n"
             "Use /end to finish the conversation."
@@ -228,9 +390,7 @@ class JCNBot:
 
     async def end_chat(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """End an AI chat session"""
-        user_id = update.effective_user.id
-        if user_id in self.active_conversations:
-            del self.active_conversations[user_id]
+        await self.conversation_store.clear(update.effective_user.id)
         await update.message.reply_text("Chat session ended. Thanks for talking with me!")
         return ConversationHandler.END
 
@@ -242,8 +402,46 @@ class JCNBot:
                 "Sorry, something went wrong! Please try again later."
             )
 
-    def read_context_file(self) -> str:
-        """Read and parse the context file"""
+    @staticmethod
+    def _get_mtime(path: str) -> int:
+        """Get a file's modification time in ns, or 0 if it can't be read"""
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return 0
+
+    def read_context_file(self, is_group_chat: bool = False) -> str:
+        """Get the compiled context, rebuilding it only when a context file changed"""
+        # Returning the same string until then keeps the system prompt a
+        # byte-stable prefix for OpenAI's prompt caching; the group variant
+        # only appends to the end of it
+        mtimes = (
+            self._get_mtime(self.system_prompt_file),
+            self._get_mtime(self.jason_context_file),
+            self._get_mtime(self.context_file)
+        )
+        if self._context_cache is not None and mtimes == self._context_mtimes:
+            return self._context_cache[is_group_chat]
+            
+        full_context = self._compile_context()
+        if full_context is not None:
+            self._context_cache = (full_context, f"{full_context}\n\n{GROUP_CHAT_PROMPT}")
+            self._system_messages = tuple(
+                {"role": "system", "content": context} for context in self._context_cache
+            )
+            self._context_mtimes = mtimes
+            return self._context_cache[is_group_chat]
+        return "Error reading context."
+
+    def system_message(self, is_group_chat: bool = False) -> dict:
+        """Get the system message for the compiled context, reused until a context file changes"""
+        context = self.read_context_file(is_group_chat)
+        if self._system_messages is not None and self._system_messages[is_group_chat]["content"] is context:
+            return self._system_messages[is_group_chat]
+        return {"role": "system", "content": context}
+
+    def _compile_context(self) -> Optional[str]:
+        """Read and combine the context files, or None if that fails"""
         try:
             # Read system prompt
             system_prompt = "You are a Telegram bot. "
@@ -289,7 +487,7 @@ class JCNBot:
             
         except Exception as e:
             logger.error(f"Error compiling context: {e}")
-            return "Error reading context."
+            return None
 
     async def handle_chat_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle messages in an AI chat session"""
@@ -305,32 +503,46 @@ class JCNBot:
             content=message
         )
         
-        # Get conversation history
-        conversation = self.active_conversations.get(user_id, [])
-        
         try:
             await context.bot.send_chat_action(
                 chat_id=update.effective_chat.id,
                 action="typing"
             )
             
-            # Prepare messages with context and history
-            messages = [
-                {"role": "system", "content": self.read_context_file()}
-            ] + conversation + [
-                {"role": "user", "content": message}
-            ]
-            
-            response = await self.openai_client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=messages,
-                functions=self.get_function_definitions(),
-                function_call="auto",
-                max_tokens=1024
+            # Chain from the previous response instead of resending the history;
+            # outputs of functions called last turn go along with the new message,
+            # as does the summary of a chain that was just restarted
+            state = await self.conversation_store.get(user_id)
+            summary = []
+            if state.summary:
+                summary.append({"role": "system", "content": f"Earlier conversation summary: {state.summary}"})
+            stream = await self.openai_client.responses.create(
+                model=OPENAI_MODEL,
+                instructions=self.read_context_file(),
+                input=summary + list(state.tool_outputs) + [
+                    {"role": "user", "content": message}
+                ],
+                previous_response_id=state.response_id,
+                tools=RESPONSE_TOOLS,
+                max_output_tokens=1024,
+                stream=True
             )
+            response, function_calls, content = await self.stream_response(update, stream)
             
             # Handle response
-            await self.process_ai_response(update, context, response, conversation)
+            tool_outputs = await self.process_ai_response(
+                update, context, function_calls, content, content_sent=True
+            )
+            
+            # Only advance the chain once the response was fully handled, so a
+            # failed turn doesn't leave function calls without outputs
+            if tool_outputs is not None:
+                state = ChatState(response.id, tool_outputs, state.turns + 1)
+                await self.conversation_store.set(user_id, state)
+                if state.turns >= CHAT_SUMMARY_TURNS:
+                    context.application.create_task(
+                        self.summarize_chat(user_id, state), update=update
+                    )
             
             return 'CHATTING'
             
@@ -339,6 +551,32 @@ class JCNBot:
             await update.message.reply_text(f"Sorry, I encountered an error: {str(e)}")
             return 'CHATTING'
 
+    async def summarize_chat(self, user_id: int, state: ChatState):
+        """Replace a user's long response chain with a summary of it"""
+        if user_id in self._summarizing_users:
+            return
+        self._summarizing_users.add(user_id)
+        try:
+            response = await self.openai_client.responses.create(
+                model=OPENAI_MODEL,
+                input=list(state.tool_outputs) + [
+                    {"role": "user", "content": CHAT_SUMMARY_PROMPT}
+                ],
+                previous_response_id=state.response_id,
+                max_output_tokens=CHAT_SUMMARY_MAX_TOKENS
+            )
+            if response.output_text:
+                # The next turn starts a new chain seeded with the summary. If
+                # the user sent another message meanwhile, leave the state alone;
+                # a later turn will try again
+                await self.conversation_store.replace(
+                    user_id, state.response_id, ChatState(summary=response.output_text)
+                )
+        except Exception as e:
+            logger.error(f"Failed to summarize chat for {user_id}: {e}")
+        finally:
+            self._summarizing_users.discard(user_id)
+
     async def handle_inline_query(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle inline queries in group chats"""
         query = update.inline_query.query
@@ -347,26 +585,30 @@ class JCNBot:
             return
             
         try:
-            # Generate response using AI
-            response = await self.openai_client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": self.read_context_file()},
-                    {"role": "user", "content": query}
-                ],
-                functions=self.get_function_definitions(),
-                function_call="auto",
-                max_tokens=1024
-            )
+            system_message = self.system_message()
+            system_prompt = system_message["content"]
+            content = await self.response_cache.get(OPENAI_MODEL, system_prompt, query)
+            
+            if content is None:
+                # Generate response using AI
+                response = await self.openai_client.chat.completions.create(
+                    model=OPENAI_MODEL,
+                    messages=[system_message, {"role": "user", "content": query}],
+                    functions=self.get_function_definitions(),
+                    function_call="auto",
+                    max_tokens=1024
+                )
+                function_calls, content = self._unpack_response(response)
+                await self.cache_response(system_prompt, query, function_calls, content)
             
             # Create inline results
             results = [
                 InlineQueryResultArticle(
                     id=str(uuid4()),
                     title="AI Response",
-                    description=response.choices[0].message.content[:100] + "...",
+                    description=content[:100] + "...",
                     input_message_content=InputTextMessageContent(
-                        response.choices[0].message.content
+                        content
                     )
                 )
             ]
@@ -376,98 +618,225 @@ class JCNBot:
         except Exception as e:
             logger.error(f"Error in inline query: {str(e)}", exc_info=True)
 
+    async def embed_text(self, text: str) -> list:
+        """Embed text with OpenAI for the semantic response cache"""
+        response = await self.openai_client.embeddings.create(
+            model="text-embedding-3-small",
+            input=text
+        )
+        return response.data[0].embedding
+
+    async def cache_response(self, system_prompt: str, user_message: str,
+                             function_calls: list, content: Optional[str]):
+        """Cache a plain text AI response; function calls are never cached"""
+        if content and not function_calls:
+            await self.response_cache.put(OPENAI_MODEL, system_prompt, user_message, content)
+
+    async def reply_cached_response(self, update: Update, content: str):
+        """Reply in a group chat with a cached response and log it"""
+        await update.message.reply_text(
+            content,
+            reply_to_message_id=update.message.message_id
+        )
+        await self.conversation_logger.log_message(
+            user_id=update.effective_user.id,
+            user_name=update.effective_user.first_name,
+            message_type="assistant",
+            content=content
+        )
+
     def get_function_definitions(self):
         """Get the list of available functions for the API"""
-        return [
-            {
-                "name": name,
-                "description": func["function"].__doc__,
-                "parameters": func["parameters"]
-            }
-            for name, func in AVAILABLE_FUNCTIONS.items()
-        ]
+        return FUNCTION_DEFINITIONS
+
+
+    @staticmethod
+    def _unpack_response(response):
+        """Get (function_calls, content) from a Chat Completions or Responses API result"""
+        if response.object == "response":
+            function_calls = [item for item in response.output if item.type == "function_call"]
+            return function_calls, response.output_text or None
+            
+        response_message = response.choices[0].message
+        # The SDK always sets function_call, to None when there is no call
+        function_call = response_message.function_call
+        function_calls = [function_call] if function_call is not None else []
+        return function_calls, response_message.content
+
+    async def stream_reply(self, update: Update, text_deltas) -> Optional[str]:
+        """Send streamed text as one message, editing it in place as more arrives"""
+        is_group_chat = update.effective_chat.type in ["group", "supergroup"]
+        if is_group_chat:
+            edit_interval, edits_left = GROUP_STREAM_EDIT_INTERVAL, GROUP_STREAM_MAX_EDITS
+        else:
+            edit_interval, edits_left = STREAM_EDIT_INTERVAL, None
+        message = None
+        text = ""
+        sent_text = ""
+        last_edit = 0.0
+        
+        async for delta in text_deltas:
+            text += delta
+            if message is None:
+                # Send on the first real text so output shows as soon as it's generated
+                if text.strip():
+                    message = await update.message.reply_text(
+                        text,
+                        reply_to_message_id=update.message.message_id if is_group_chat else None
+                    )
+                    sent_text = text
+                    last_edit = time.monotonic()
+                continue
+                
+            # Gate edits to stay well under Telegram's edit flood limits
+            if (edits_left != 0
+                    and len(text) - len(sent_text) >= STREAM_EDIT_MIN_CHARS
+                    and time.monotonic() - last_edit >= edit_interval
+                    and text.strip() != sent_text.strip()):
+                await message.edit_text(text)
+                sent_text = text
+                last_edit = time.monotonic()
+                if edits_left is not None:
+                    edits_left -= 1
+                
+        # Telegram trims message text and rejects edits that change nothing
+        # ("message is not modified"), so skip whitespace-only changes
+        if message is not None and text.strip() != sent_text.strip():
+            await message.edit_text(text)
+        # The full text, or None if nothing was sent
+        return text if message is not None else None
+
+    async def stream_chat_completion(self, update: Update, stream):
+        """Stream a Chat Completion into the chat and return (function_calls, content)"""
+        function_call = {"name": "", "arguments": ""}
+        
+        async def text_deltas():
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                # Function call name and arguments arrive in fragments too
+                if delta.function_call:
+                    function_call["name"] += delta.function_call.name or ""
+                    function_call["arguments"] += delta.function_call.arguments or ""
+                if delta.content:
+                    yield delta.content
+                    
+        content = await self.stream_reply(update, text_deltas())
+        function_calls = [SimpleNamespace(**function_call)] if function_call["name"] else []
+        return function_calls, content
 
+    async def stream_response(self, update: Update, stream):
+        """Stream a Responses API response into the chat and return (response, function_calls, content)"""
+        final = {}
+        
+        async def text_deltas():
+            async for event in stream:
+                if event.type == "response.output_text.delta":
+                    yield event.delta
+                elif event.type in ("response.completed", "response.incomplete"):
+                    final["response"] = event.response
+                    
+        content = await self.stream_reply(update, text_deltas())
+        if "response" not in final:
+            raise RuntimeError("Response stream ended without a final response")
+        function_calls, _ = self._unpack_response(final["response"])
+        return final["response"], function_calls, content
 
     async def process_ai_response(self, update: Update, context: ContextTypes.DEFAULT_TYPE, 
-                                response, conversation):
+                                function_calls: list, content: Optional[str], content_sent: bool = False):
         """Process and handle AI response including function calls"""
         user_id = update.effective_user.id
         user_name = update.effective_user.first_name
-        response_message = response.choices[0].message
+        msg = update.message
+        # In groups, replies are threaded to the message being answered
         is_group_chat = update.effective_chat.type in ["group", "supergroup"]
+        reply_to = msg.message_id if is_group_chat else None
+        tool_outputs = []
         
         try:
             # Handle function calls
-            if hasattr(response_message, 'function_call') and response_message.function_call:
-                function_name = response_message.function_call.name
-                function_args = json.loads(response_message.function_call.arguments)
+            for function_call in function_calls:
+                function_name = function_call.name
+                function_args = orjson.loads(function_call.arguments)
+                output = {"success": False, "message": f"Unknown function: {function_name}"}
                 
                 if function_name in AVAILABLE_FUNCTIONS:
                     function_to_call = AVAILABLE_FUNCTIONS[function_name]["function"]
                     function_response = await function_to_call(**function_args)
+                    output = asdict(function_response)
+                    
+                    # Send function result, logging the call alongside rather than first
+                    async with asyncio.TaskGroup() as tg:
+                        tg.create_task(msg.reply_text(
+                            f"Function call result:\n{function_response.message}\n\n"
+                            f"{'Success' if function_response.success else 'Failed'}",
+                            reply_to_message_id=reply_to
+                        ))
+                        tg.create_task(self.conversation_logger.log_function_call(
+                            user_id=user_id,
+                            user_name=user_name,
+                            function_name=function_name,
+                            arguments=function_args,
+                            response=output
+                        ))
+                
+                # Responses API function calls need their output on the next turn
+                call_id = getattr(function_call, "call_id", None)
+                if call_id:
+                    tool_outputs.append({
+                        "type": "function_call_output",
+                        "call_id": call_id,
+                        "output": orjson.dumps(output).decode()
+                    })
+            
+            # Send and log the text response
+            if content:
+                async with asyncio.TaskGroup() as tg:
+                    # Streamed content is already in the chat and is only logged
+                    if not content_sent:
+                        tg.create_task(msg.reply_text(
+                            content,
+                            reply_to_message_id=reply_to
+                        ))
                     
-                    # Log function call
-                    await self.conversation_logger.log_function_call(
+                    # Log assistant's response
+                    tg.create_task(self.conversation_logger.log_message(
                         user_id=user_id,
                         user_name=user_name,
-                        function_name=function_name,
-                        arguments=function_args,
-                        response=function_response.__dict__
-                    )
-                    
-                    # Send function result
-                    await update.message.reply_text(
-                        f"Function call result:\n{function_response.message}\n\n"
-                        f"{'Success' if function_response.success else 'Failed'}",
-                        reply_to_message_id=update.message.message_id if is_group_chat else None
-                    )
-                    
-                    # Only update conversation history for private chats
-                    if not is_group_chat:
-                        conversation.extend([
-                            {
-                                "role": "assistant",
-                                "content": None,
-                                "function_call": {
-                                    "name": function_name,
-                                    "arguments": json.dumps(function_args)
-                                }
-                            },
-                            {
-                                "role": "function",
-                                "name": function_name,
-                                "content": json.dumps(function_response.__dict__)
-                            }
-                        ])
+                        message_type="assistant",
+                        content=content
+                    ))
             
-            # Send and log the text response
-            if response_message.content:
-                await update.message.reply_text(
-                    response_message.content,
-                    reply_to_message_id=update.message.message_id if is_group_chat else None
-                )
-                
-                # Log assistant's response
-                await self.conversation_logger.log_message(
-                    user_id=user_id,
-                    user_name=user_name,
-                    message_type="assistant",
-                    content=response_message.content
-                )
-                
-                # Only update conversation history for private chats
-                if not is_group_chat:
-                    conversation.append({
-                        "role": "assistant",
-                        "content": response_message.content
-                    })
+            # Outputs for the next Responses API turn (always empty for Chat
+            # Completions); None below means processing failed
+            return tool_outputs
         
         except Exception as e:
             logger.error(f"Error in process_ai_response: {str(e)}", exc_info=True)
-            await update.message.reply_text(
+            await msg.reply_text(
                 "Sorry, I encountered an error while processing the response.",
-                reply_to_message_id=update.message.message_id if is_group_chat else None
+                reply_to_message_id=reply_to
             )
+            return None
+
+    @staticmethod
+    def _compile_mention_re(bot_username: Optional[str]):
+        """Compile a case-insensitive pattern matching mentions of the bot"""
+        names = ["@jdawg_bot"]
+        if bot_username:
+            names.append(f"@{re.escape(bot_username)}")
+        return re.compile(rf"(?i)(?:{'|'.join(names)})\b")
+
+    async def post_init(self, application: Application):
+        """Cache per-bot state that is fixed once the application has initialized"""
+        # initialize() has fetched the bot's own user, so its username is known
+        self._mention_re = self._compile_mention_re(application.bot.username)
+
+    async def post_shutdown(self, application: Application):
+        """Flush pending conversation logs and close the state store once the application has stopped"""
+        await self.conversation_logger.aclose()
+        await self.conversation_store.aclose()
 
     def run(self):
         """Run the bot until the user presses Ctrl-C"""
@@ -0,0 +1,113 @@
+from collections import OrderedDict
+import hashlib
+import logging
+from typing import Awaitable, Callable, List, Optional
+
+try:
+    import numpy as np
+except ImportError:  # Only needed for the optional semantic tier
+    np = None
+
+logger = logging.getLogger(__name__)
+
+class ResponseCache:
+    """Two-tier cache of AI text responses for stateless prompts
+
+    The exact tier is an LRU keyed by a hash of (model, system prompt, user
+    message). If an `embed` coroutine is given (text -> unit-length vector),
+    a semantic tier also returns the response for a previous message whose
+    embedding has cosine similarity >= `similarity_threshold`, under the same
+    model and system prompt.
+    """
+
+    def __init__(self, maxsize: int = 1024,
+                 embed: Optional[Callable[[str], Awaitable[List[float]]]] = None,
+                 similarity_threshold: float = 0.95, max_semantic_entries: int = 256):
+        """Initialize the cache, enabling the semantic tier when `embed` is given"""
+        self.maxsize = maxsize
+        self.similarity_threshold = similarity_threshold
+        self.max_semantic_entries = max_semantic_entries
+        self._entries = OrderedDict()  # key -> response text
+
+        if embed is not None and np is None:
+            logger.warning("numpy is not installed; semantic response cache disabled")
+            embed = None
+        self._embed = embed
+        self._vectors = OrderedDict()  # user message -> embedding, memoized between get/put
+        self._semantic = OrderedDict()  # key -> (namespace, embedding)
+
+    @staticmethod
+    def _hash(*parts: str) -> str:
+        """Hash strings into a short hex digest"""
+        return hashlib.blake2b("|".join(parts).encode("utf-8"), digest_size=16).hexdigest()
+
+    def _keys(self, model: str, system_prompt: str, user_message: str) -> tuple:
+        """Get the (namespace, key) for a prompt"""
+        namespace = self._hash(model, system_prompt)
+        return namespace, self._hash(namespace, user_message)
+
+    async def _vector(self, text: str):
+        """Embed text, reusing the embedding computed for a recent lookup"""
+        vector = self._vectors.get(text)
+        if vector is None:
+            vector = np.asarray(await self._embed(text), dtype=np.float32)
+            self._vectors[text] = vector
+            if len(self._vectors) > self.max_semantic_entries:
+                self._vectors.popitem(last=False)
+        else:
+            self._vectors.move_to_end(text)
+        return vector
+
+    async def get(self, model: str, system_prompt: str, user_message: str) -> Optional[str]:
+        """Get a cached response for a prompt, or None on a miss"""
+        namespace, key = self._keys(model, system_prompt, user_message)
+        response = self._entries.get(key)
+        if response is not None:
+            self._entries.move_to_end(key)
+            return response
+
+        if self._embed is None or not self._semantic:
+            return None
+
+        try:
+            vector = await self._vector(user_message)
+        except Exception as e:
+            logger.error(f"Failed to embed message for response cache: {e}")
+            return None
+
+        candidates = [(k, v) for k, (ns, v) in self._semantic.items() if ns == namespace]
+        if not candidates:
+            return None
+        scores = np.stack([v for _, v in candidates]) @ vector
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity_threshold:
+            return None
+
+        best_key = candidates[best][0]
+        response = self._entries.get(best_key)
+        if response is not None:
+            self._entries.move_to_end(best_key)
+        return response
+
+    async def put(self, model: str, system_prompt: str, user_message: str, response: str):
+        """Cache a text response for a prompt"""
+        namespace, key = self._keys(model, system_prompt, user_message)
+        self._entries[key] = response
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            evicted, _ = self._entries.popitem(last=False)
+            self._semantic.pop(evicted, None)
+
+        if self._embed is None:
+            return
+
+        try:
+            vector = await self._vector(user_message)
+        except Exception as e:
+            logger.error(f"Failed to embed message for response cache: {e}")
+            return
+
+        self._semantic[key] = (namespace, vector)
+        self._semantic.move_to_end(key)
+        if len(self._semantic) > self.max_semantic_entries:
+            self._semantic.popitem(last=False)
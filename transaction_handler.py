@@ -1,8 +1,41 @@
-from web3 import Web3
+import asyncio
+from web3 import AsyncWeb3, AsyncHTTPProvider, Web3
 from eth_account import Account
 import os
 from decimal import Decimal
+from functools import lru_cache
 from typing import NamedTuple, Optional
+from base_network import RECEIPT_POLL_LATENCY, RECEIPT_TIMEOUT
+
+# Standard ERC20 functions used on the Base USDC contract
+USDC_ABI = (
+    # ERC20 transfer function
+    {
+        "constant": False,
+        "inputs": [
+            {"name": "_to", "type": "address"},
+            {"name": "_value", "type": "uint256"}
+        ],
+        "name": "transfer",
+        "outputs": [{"name": "", "type": "bool"}],
+        "payable": False,
+        "stateMutability": "nonpayable",
+        "type": "function"
+    },
+    # balanceOf function
+    {
+        "constant": True,
+        "inputs": [{"name": "_owner", "type": "address"}],
+        "name": "balanceOf",
+        "outputs": [{"name": "balance", "type": "uint256"}],
+        "payable": False,
+        "stateMutability": "view",
+        "type": "function"
+    }
+)
+
+# Memoized checksumming; each call otherwise runs a Keccak-256 over the address
+_to_checksum_address = lru_cache(maxsize=256)(Web3.to_checksum_address)
 
 class TransactionResult(NamedTuple):
     success: bool
@@ -11,36 +44,11 @@ class TransactionResult(NamedTuple):
 
 class USDCTransactionHandler:
     def __init__(self):
-        # Initialize Web3 with Base network
-        self.w3 = Web3(Web3.HTTPProvider(os.getenv('BASE_RPC_URL')))
+        # Initialize async Web3 with Base network so RPCs don't block the event loop
+        self.w3 = AsyncWeb3(AsyncHTTPProvider(os.getenv('BASE_RPC_URL')))
         
         # USDC contract details for Base
         self.usdc_address = os.getenv('USDC_CONTRACT_ADDRESS')
-        self.usdc_abi = [
-            # ERC20 transfer function
-            {
-                "constant": False,
-                "inputs": [
-                    {"name": "_to", "type": "address"},
-                    {"name": "_value", "type": "uint256"}
-                ],
-                "name": "transfer",
-                "outputs": [{"name": "", "type": "bool"}],
-                "payable": False,
-                "stateMutability": "nonpayable",
-                "type": "function"
-            },
-            # balanceOf function
-            {
-                "constant": True,
-                "inputs": [{"name": "_owner", "type": "address"}],
-                "name": "balanceOf",
-                "outputs": [{"name": "balance", "type": "uint256"}],
-                "payable": False,
-                "stateMutability": "view",
-                "type": "function"
-            }
-        ]
         
         # Load bot's wallet
         self.private_key = os.getenv('BOT_PRIVATE_KEY')
@@ -49,14 +57,14 @@ class USDCTransactionHandler:
         
         self.account = Account.from_key(self.private_key)
         self.usdc_contract = self.w3.eth.contract(
-            address=self.w3.to_checksum_address(self.usdc_address),
-            abi=self.usdc_abi
+            address=_to_checksum_address(self.usdc_address),
+            abi=USDC_ABI
         )
 
     async def get_balance(self) -> TransactionResult:
         """Get the current USDC balance of the bot's wallet"""
         try:
-            balance = self.usdc_contract.functions.balanceOf(
+            balance = await self.usdc_contract.functions.balanceOf(
                 self.account.address
             ).call()
             
@@ -92,11 +100,14 @@ class USDCTransactionHandler:
             # Convert amount to wei (USDC has 6 decimals)
             amount_wei = int(amount * 10 ** 6)
             
-            # Check balance
-            balance = self.usdc_contract.functions.balanceOf(
-                self.account.address
-            ).call()
+            # Fetch balance, nonce and gas price concurrently (one round trip of latency)
+            balance, nonce, gas_price = await asyncio.gather(
+                self.usdc_contract.functions.balanceOf(self.account.address).call(),
+                self.w3.eth.get_transaction_count(self.account.address),
+                self.w3.eth.gas_price
+            )
             
+            # Check balance
             if balance < amount_wei:
                 return TransactionResult(
                     success=False,
@@ -104,14 +115,14 @@ class USDCTransactionHandler:
                 )
             
             # Prepare transaction
-            transaction = self.usdc_contract.functions.transfer(
-                self.w3.to_checksum_address(to_address),
+            transaction = await self.usdc_contract.functions.transfer(
+                _to_checksum_address(to_address),
                 amount_wei
             ).build_transaction({
                 'from': self.account.address,
-                'nonce': self.w3.eth.get_transaction_count(self.account.address),
+                'nonce': nonce,
                 'gas': 100000,  # Estimate gas limit
-                'gasPrice': self.w3.eth.gas_price
+                'gasPrice': gas_price
             })
             
             # Sign and send transaction
@@ -119,10 +130,12 @@ class USDCTransactionHandler:
                 transaction, 
                 self.private_key
             )
-            tx_hash = self.w3.eth.send_raw_transaction(signed_txn.rawTransaction)
+            tx_hash = await self.w3.eth.send_raw_transaction(signed_txn.raw_transaction)
             
             # Wait for transaction receipt
-            receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
+            receipt = await self.w3.eth.wait_for_transaction_receipt(
+                tx_hash, timeout=RECEIPT_TIMEOUT, poll_latency=RECEIPT_POLL_LATENCY
+            )
             
             if receipt['status'] == 1:
                 return TransactionResult(
@@ -143,10 +156,13 @@ class USDCTransactionHandler:
                 message=f"Transaction failed: {str(e)}"
             )
 
+# One shared handler: a single Web3 provider, account and contract for both functions
+_usdc_handler = USDCTransactionHandler()
+
 # Add to custom_functions.py:
 AVAILABLE_FUNCTIONS = {
     "get_balance": {
-        "function": USDCTransactionHandler().get_balance,
+        "function": _usdc_handler.get_balance,
         "parameters": {
             "type": "object",
             "properties": {},
@@ -154,7 +170,7 @@ AVAILABLE_FUNCTIONS = {
         }
     },
     "send_usdc": {
-        "function": USDCTransactionHandler().send_usdc,
+        "function": _usdc_handler.send_usdc,
         "parameters": {
             "type": "object",
             "properties": {